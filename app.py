@@ -1,31 +1,48 @@
 """Python Store Inventory Management App"""
 
 import csv
+import sys
 import time
 from datetime import datetime
-from statistics import mean, median, mode, pstdev, pvariance, quantiles
+from functools import lru_cache
 
-from sqlalchemy import func
+import numpy as np
+from sqlalchemy import func, insert, select
 
 from models import Base, Brand, Product, engine, session
 
-
-def main_menu():
-    """Display the main menu and get user input."""
-    while True:
-        print()
-        print('Store Inventory Management App'.center(50))
-        print('='*50)
-        print('MAIN MENU'.center(50))
-        print('='*50)
-        print('''
+# Month names indexed by month number, used by humanize_date() to avoid
+# parsing a strftime() format string for every date.
+_MONTHS = ('', 'January', 'February', 'March', 'April', 'May', 'June', 'July',
+           'August', 'September', 'October', 'November', 'December')
+
+# Menu text is built once at import instead of on every loop iteration.
+_MAIN_MENU_BANNER = '\n'.join([
+    'Store Inventory Management App'.center(50),
+    '='*50,
+    'MAIN MENU'.center(50),
+    '='*50,
+])
+_MAIN_MENU_OPTIONS = '''
             \rN) New Product
             \rV) View a Product by ID
             \rA) View Product Analysis
             \rB) Backup the Database
             \rL) List All Products
             \rR) List All Brands
-            \rQ) Quit the Application''')
+            \rQ) Quit the Application'''
+_PRODUCT_MENU_OPTIONS = '''
+            e - edit product
+            d - delete product
+            q - return to main menu'''
+
+
+def main_menu():
+    """Display the main menu and get user input."""
+    while True:
+        print()
+        print(_MAIN_MENU_BANNER)
+        print(_MAIN_MENU_OPTIONS)
         choice = input("\nWhat would you like to do? ").strip().lower()
         # Validate users choice
         if choice in ['n', 'v', 'a', 'b', 'l', 'r', 'q']:
@@ -39,10 +56,7 @@ def main_menu():
 def product_menu():
     """Display the product sub menu and get user input."""
     while True:
-        print('''
-            e - edit product
-            d - delete product
-            q - return to main menu''')
+        print(_PRODUCT_MENU_OPTIONS)
         choice = input("\nWhat would you like to do? ").strip().lower()
         # Validate users choice
         if choice in ['e', 'd', 'q']:
@@ -79,12 +93,16 @@ def humanize_date(date):
     Returns:
         datetime.date: Date in human friendly format.
     """
-    return date.strftime('%B %d, %Y')
+    return f'{_MONTHS[date.month]} {date.day:02d}, {date.year}'
 
 
 def clean_price(price_str):
     """Clean price string from user input.
 
+    Dollars and cents are parsed as integers directly to avoid float
+    rounding errors (e.g. 0.29 becoming 28 cents). Digits past the second
+    decimal place are dropped.
+
     Args:
         price_str (str): String to interpret as a price.
 
@@ -92,7 +110,15 @@ def clean_price(price_str):
         int: Price in cents
     """
     try:
-        price_float = float(price_str.lstrip('$'))
+        dollars, _, cents = price_str.lstrip('$').strip().partition('.')
+        sign = dollars[:1] if dollars[:1] in ('+', '-') else ''
+        dollars = dollars[len(sign):]
+        # Allow a missing dollar amount when cents are given (e.g. .99)
+        if not dollars and cents:
+            dollars = '0'
+        if not dollars.isdecimal() or (cents and not cents.isdecimal()):
+            raise ValueError(f'invalid price: {price_str!r}')
+        price_cents = int(sign + dollars + (cents + '00')[:2])
     except ValueError:
         input('''
               \n***** PRICE ERROR *****
@@ -101,7 +127,7 @@ def clean_price(price_str):
               \rPress enter to try again.''')
         return
     else:
-        return int(price_float * 100)
+        return price_cents
 
 
 def humanize_price(price):
@@ -116,16 +142,18 @@ def humanize_price(price):
     return f'${price / 100:.2f}'
 
 
-def check_id(id_str, id_options):
+def check_id(id_str, id_options=None):
     """Clean id string from user input.
 
     Used to check product id and brand id.
 
-    Check if id entered is a number and if it is in the list of valid ids.
+    Check if id entered is a number and if it is in the valid ids.
 
     Args:
         id_str (str): String to interpret as an id.
-        id_options (list): List of valid id numbers.
+        id_options (set or range, optional): Valid id numbers. Use a set or
+            range so the membership check doesn't scan a list. If None, only
+            check that the id is a number.
     """
     try:
         item_id = int(id_str)
@@ -136,11 +164,11 @@ def check_id(id_str, id_options):
               \rPress enter to try again.''')
         return
     else:
-        if item_id in id_options:
+        if id_options is None or item_id in id_options:
             return item_id
         else:
             input(f'''***** ID ERROR *****
-              \rOptions are: {', '.join(map(str, id_options))}
+              \rOptions are: {', '.join(map(str, sorted(id_options)))}
               \rPress enter to try again.''')
             return
 
@@ -164,13 +192,18 @@ def check_quantity(qty):
         return qty_int
 
 
+@lru_cache(maxsize=None)
 def get_brand_name(brand_id):
     """Get brand name from brand id.
 
+    Results are cached since there are few brands and the same ids are
+    looked up repeatedly. Call get_brand_name.cache_clear() after changing
+    brands in the database.
+
     Args:
         brand_id (int): The brand id to lookup.
     """
-    brand = session.query(Brand).filter_by(brand_id=brand_id).first()
+    brand = session.scalars(select(Brand).filter_by(brand_id=brand_id)).first()
     if brand:
         return brand.brand_name
     else:
@@ -227,10 +260,10 @@ def get_brand_input(current_value):
     id_cleaned = None
     while id_error:
         # List brand ids with brand names
-        id_options = []
+        id_options = set()
         print("Brand options list:")
-        for brand in session.query(Brand).order_by(Brand.brand_id):
-            id_options.append(brand.brand_id)
+        for brand in session.scalars(select(Brand).order_by(Brand.brand_id)):
+            id_options.add(brand.brand_id)
             print(f'{brand.brand_id}) {brand.brand_name}')
         if current_value:
             # If there's a current value, we're updating and existing product
@@ -239,16 +272,16 @@ def get_brand_input(current_value):
                 .format(
                     current_value,
                     get_brand_name(current_value),
-                    id_options[0],
-                    id_options[-1]
+                    min(id_options),
+                    max(id_options)
                 )).strip()
         else:
             # If no current value, we must be creating a new product
             id_str = input(
                 "Enter a brand's ID ({}-{}) or 'X' if the brand is not listed: "
                 .format(
-                    id_options[0],
-                    id_options[-1]
+                    min(id_options),
+                    max(id_options)
                 )).strip()
 
         if id_str.lower() == 'x':
@@ -285,25 +318,27 @@ def add_product():
     quantity_input = get_quantity_input(None)
     price_input = get_price_input(None)
     brand_input = get_brand_input(None)
+    # Use one timestamp for whichever branch below saves the product
+    now = datetime.now()
     # Check for duplicate product names
     # If duplicate product names are found while attempting to add a new
     # product, get the most recently updated and save to that existing product.
-    duplicate_product_names_in_db = session.query(Product).filter_by(product_name=name).order_by(Product.date_updated.desc())
-    if duplicate_product_names_in_db.count() > 0:
+    # Since results are ordered by date_updated, the first result is the
+    # most recently updated product. first() only needs a LIMIT 1 query.
+    product = session.scalars(select(Product).filter_by(product_name=name).order_by(Product.date_updated.desc())).first()
+    if product is not None:
         # Let the user know how many duplicate product names already exist
         print('\nNOTE: {} duplicate product(s) found with the same name: {}'
               .format(
-                  duplicate_product_names_in_db.count(),
+                  session.scalar(select(func.count(Product.product_id))
+                                 .filter_by(product_name=name)),
                   name)
               )
-        # Since results are ordered by date_updated, the first result is the
-        # most recently updated product.
-        product = duplicate_product_names_in_db[0]
         print(f'The most recently edited version will be updated (product ID {product.product_id})')
         product.product_quantity = quantity_input
         product.product_price = price_input
         product.brand_id = brand_input
-        product.date_updated = datetime.now()
+        product.date_updated = now
         # Confirm input
         confirm = confirm_product_info(
             name,
@@ -329,7 +364,7 @@ def add_product():
                                   product_quantity=quantity_input,
                                   product_price=price_input,
                                   brand_id=brand_input,
-                                  date_updated=datetime.now())
+                                  date_updated=now)
             session.add(new_product)
             session.commit()
             print(f'\n{name} has been added to the database.')
@@ -340,7 +375,7 @@ def add_product():
 
 def edit_product(product_id):
     """Edit a product in the database."""
-    product = session.query(Product).filter_by(product_id=product_id).one()
+    product = session.scalars(select(Product).filter_by(product_id=product_id)).one()
     print('-'*50)
     print(f'Editing {product.product_name}')
     # Get input values
@@ -369,17 +404,35 @@ def edit_product(product_id):
 def view_product():
     """View a product by id."""
     print_section_header('VIEW PRODUCT BY ID')
-    id_options = []
-    id_cleaned = None
-    for product in session.query(Product).order_by(Product.product_id):
-        id_options.append(product.product_id)
-    id_error = True
-    while id_error:
+    # Get the lowest and highest product ids in one aggregate query to show
+    # in the prompt.
+    min_id, max_id = session.execute(select(
+        func.min(Product.product_id),
+        func.max(Product.product_id)
+    )).one()
+    if min_id is None:
+        print('There are no products in the database.')
+        time.sleep(1.5)
+        return
+    the_product = None
+    while the_product is None:
         id_str = input(
-            f"Enter a product's ID number ({id_options[0]}-{id_options[-1]}): ").strip()
-        id_cleaned = check_id(id_str, id_options)
-        id_error = False
-    the_product = session.query(Product).filter_by(product_id=id_cleaned).one_or_none()
+            f"Enter a product's ID number ({min_id}-{max_id}): ").strip()
+        id_cleaned = check_id(id_str)
+        if id_cleaned is None:
+            continue
+        if not min_id <= id_cleaned <= max_id:
+            input(f'''***** ID ERROR *****
+              \rOptions are: {min_id}-{max_id}
+              \rPress enter to try again.''')
+            continue
+        # Look the product up by primary key. Gaps left by deleted products
+        # come back as None.
+        the_product = session.get(Product, id_cleaned)
+        if the_product is None:
+            input(f'''***** ID ERROR *****
+              \rThere is no product with the id {id_cleaned}.
+              \rPress enter to try again.''')
     print('*'*50)
     print(f'''*** {the_product.product_name} ***
           \rPrice: {humanize_price(the_product.product_price)}
@@ -408,7 +461,9 @@ def backup_db():
     print_section_header('BACKUP DATABASE')
     print("Backing up data...")
     time.sleep(1.5)
-    with open('backup_inventory.csv', 'w', newline='') as csvfile:
+    # Use a large write buffer so rows are flushed to disk in big chunks
+    with open('backup_inventory.csv', 'w', newline='',
+              buffering=8 * 1024 * 1024) as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(['product_id',
                          'product_name',
@@ -416,48 +471,69 @@ def backup_db():
                          'product_price',
                          'brand_id',
                          'date_updated'])
-        for product in session.query(Product).order_by(Product.product_id):
-            writer.writerow([product.product_id,
-                             product.product_name,
-                             product.product_quantity,
-                             product.product_price,
-                             product.brand_id,
-                             product.date_updated])
+        # Select plain column tuples instead of Product objects, stream them
+        # from the database in batches and write them 1000 rows at a time.
+        product_rows = session.execute(
+            select(Product.product_id,
+                   Product.product_name,
+                   Product.product_quantity,
+                   Product.product_price,
+                   Product.brand_id,
+                   Product.date_updated)
+            .order_by(Product.product_id)
+            .execution_options(yield_per=5000))
+        for rows in product_rows.partitions(1000):
+            writer.writerows(rows)
     print("Product data has been backed-up to the file 'inventory_backup.csv'.")
     with open('backup_brands.csv', 'w', newline='') as csvfile:
         writer = csv.writer(csvfile)
         writer.writerow(['brand_id',
                          'brand_name'])
-        for brand in session.query(Brand).order_by(Brand.brand_id):
-            writer.writerow([brand.brand_id,
-                             brand.brand_name])
+        writer.writerows(session.execute(select(Brand.brand_id,
+                                                Brand.brand_name)
+                                         .order_by(Brand.brand_id)))
     print("Brand data has been backed-up to the file 'brands.csv'.")
 
 
 def list_products():
     """List all products in the database."""
     print_section_header('LIST ALL PRODUCTS')
-    for product in session.query(Product).order_by(Product.product_id):
-        print('{}: {}, Qty: {}, Price: {}, Brand: {}, Updated: {}'
-              .format(
-                  product.product_id,
-                  product.product_name,
-                  product.product_quantity,
-                  humanize_price(product.product_price),
-                  get_brand_name(product.brand_id),
-                  humanize_date(product.date_updated)
-                  )
-              )
+    # Outer join brands so all product rows and their brand names come back
+    # in a single query instead of one brand lookup per product.
+    products_with_brands = session.execute(select(Product, Brand).outerjoin(
+        Brand, Product.brand_id == Brand.brand_id
+    ).order_by(Product.product_id))
+    # Build all lines first and write them to stdout in a single call rather
+    # than calling print() once per product.
+    lines = []
+    for product, brand in products_with_brands:
+        lines.append('{}: {}, Qty: {}, Price: {}, Brand: {}, Updated: {}'
+                     .format(
+                         product.product_id,
+                         product.product_name,
+                         product.product_quantity,
+                         humanize_price(product.product_price),
+                         brand.brand_name if brand else 'None',
+                         humanize_date(product.date_updated)
+                         )
+                     )
+    if lines:
+        sys.stdout.write('\n'.join(lines) + '\n')
     input('\nPress enter to return to the main menu.')
 
 
 def list_brands():
     """List all brands in the database."""
     print_section_header('LIST ALL BRANDS')
-    for brand in session.query(Brand).order_by(Brand.brand_id):
-        # Get the number of products associated with the brand
-        product_count = session.query(Product).filter_by(brand_id=brand.brand_id).count()
-        print(f'{brand.brand_id}: {brand.brand_name}, Number of Products: {product_count}')
+    # Get the number of products associated with each brand in one grouped
+    # query instead of running a separate count per brand.
+    brands_with_counts = session.execute(select(
+        Brand.brand_id,
+        Brand.brand_name,
+        func.count(Product.product_id)
+    ).outerjoin(Product).group_by(Brand.brand_id).order_by(Brand.brand_id))
+    for brand_id, brand_name, product_count in brands_with_counts:
+        print(f'{brand_id}: {brand_name}, Number of Products: {product_count}')
     input('\nPress enter to return to the main menu.')
 
 
@@ -465,46 +541,60 @@ def analyze_products():
     """Analyze products in the database."""
     print_section_header('PRODUCT ANALYSIS')
 
-    product_query = session.query(Product)
-
-    # Get the total number of products
-    total_products = product_query.count()
+    # Get the total number of products and the average price in a single
+    # aggregate query.
+    total_products, mean_price = session.execute(select(
+        func.count(Product.product_id),
+        func.avg(Product.product_price)
+    )).one()
 
+    # Only the name and the compared value are needed for the products below,
+    # so query those columns instead of loading full Product objects.
     # Get most expensive and least expensive products
-    most_expensive = product_query.order_by(
-        Product.product_price.desc()).first()
-    least_expensive = product_query.order_by(
-        Product.product_price.asc()).first()
+    price_query = select(Product.product_name, Product.product_price)
+    most_expensive = session.execute(price_query.order_by(
+        Product.product_price.desc())).first()
+    least_expensive = session.execute(price_query.order_by(
+        Product.product_price.asc())).first()
 
     # Get oldest and newest products
-    oldest_product = product_query.order_by(
-        Product.date_updated.asc()).first()
-    newest_product = product_query.order_by(
-        Product.date_updated.desc()).first()
-
-    # Create list of all product prices
-    product_prices = []
-    for product in product_query:
-        product_prices.append(product.product_price)
-    mean_price = mean(product_prices)
-    mode_price = mode(product_prices)
-    median_price = median(product_prices)
+    date_query = select(Product.product_name, Product.date_updated)
+    oldest_product = session.execute(date_query.order_by(
+        Product.date_updated.asc())).first()
+    newest_product = session.execute(date_query.order_by(
+        Product.date_updated.desc())).first()
+
+    # Create an array of all product prices from the price column alone
+    product_prices = np.fromiter(
+        session.scalars(select(Product.product_price)
+                        .execution_options(yield_per=10000)),
+        dtype=np.int64,
+        count=total_products)
+    # Like statistics.mode(), return the first mode encountered when several
+    # prices share the highest count.
+    unique_prices, first_index, counts = np.unique(
+        product_prices, return_index=True, return_counts=True)
+    most_common = counts == counts.max()
+    mode_price = unique_prices[most_common][
+        np.argmin(first_index[most_common])]
+    median_price = np.median(product_prices)
 
     # Get highest and lowest quantity products
-    large_qty = product_query.order_by(
-        Product.product_quantity.desc()).first()
-    low_qty = session.query(Product).order_by(
-        Product.product_quantity.asc()).first()
+    quantity_query = select(Product.product_name, Product.product_quantity)
+    large_qty = session.execute(quantity_query.order_by(
+        Product.product_quantity.desc())).first()
+    low_qty = session.execute(quantity_query.order_by(
+        Product.product_quantity.asc())).first()
 
     # Get brands with the most and least products
     # This query returns a list of tuples containing each brand_id and the
     # count of products associated with it.
     # NOTE: I'm filtering out Null (None) brand_ids because I don't want to
     # count them as an actual brand.
-    products_grouped_by_brand = session.query(
+    products_grouped_by_brand = select(
         Product.brand_id,
         func.count(Product.product_id)
-    ).group_by(Product.brand_id).filter(Product.brand_id != 0)
+    ).group_by(Product.brand_id).where(Product.brand_id != 0)
     # Since there doesn't seem to be an easy way to get the last row of a
     # query, I'm creating asc and desc lists and then getting the first()
     # item from each list.
@@ -515,17 +605,17 @@ def analyze_products():
         func.count(Product.brand_id).asc()
     )
     # These return a single tuple like (brand_id, product_count)
-    most_common_brand = brands_ordered_by_product_count_desc.first()
-    least_common_brand = brands_ordered_by_product_count_asc.first()
+    most_common_brand = session.execute(
+        brands_ordered_by_product_count_desc).first()
+    least_common_brand = session.execute(
+        brands_ordered_by_product_count_asc).first()
     # Get the brand_name value based on each brand_id
-    most_common_brand_in_db = session.query(Brand).filter_by(
-                brand_id=most_common_brand[0]).one_or_none()
-    least_common_brand_in_db = session.query(Brand).filter_by(
-                brand_id=least_common_brand[0]).one_or_none()
+    most_common_brand_in_db = session.get(Brand, most_common_brand[0])
+    least_common_brand_in_db = session.get(Brand, least_common_brand[0])
 
     # Variance
-    # DEF: pvariance() is a measure of the variability (spread or dispersion)
-    # of an entire population of data. Note variance() is a measure of the
+    # DEF: Population variance is a measure of the variability (spread or dispersion)
+    # of an entire population of data. Note sample variance is a measure of the
     # variability of a sample of data (not the entire population of values).
     # It's the average of each point from the mean.
     #
@@ -541,9 +631,9 @@ def analyze_products():
     # If this value is higher than the mean, there are a lot of extreme values,
     # and the mean is a poor estimate of the actual prices.
     #
-    # REF: https://docs.python.org/3/library/statistics.html#statistics.pvariance
+    # REF: https://numpy.org/doc/stable/reference/generated/numpy.var.html
     # I'm dividing the result by 100 here to get a dollar-friendly number.
-    pv = round(pvariance(product_prices) / 100)
+    pv = round(product_prices.var() / 100)
 
     # Standard Deviation
     # DEF: The standard deviation is a measure of how spread out numbers are.
@@ -559,8 +649,8 @@ def analyze_products():
     # a normal range, and thus we can find extremely large or small values.
     # https://www.mathsisfun.com/data/standard-deviation.html
     #
-    # REF: https://docs.python.org/3/library/statistics.html#statistics.pstdev
-    psd = pstdev(product_prices)
+    # REF: https://numpy.org/doc/stable/reference/generated/numpy.std.html
+    psd = product_prices.std()
 
     # Quartiles
     # DEF: The IQR is the difference between the 75th percentile and the 25th
@@ -572,10 +662,11 @@ def analyze_products():
     # A quartile is a type of quantile.
     # https://www.geeksforgeeks.org/interquartile-range-and-quartile-deviation-using-numpy-and-scipy/
     #
-    # REF: https://docs.python.org/3/library/statistics.html#statistics.quantiles
-    q1 = quantiles(product_prices)[0]
-    q2 = quantiles(product_prices)[1]
-    q3 = quantiles(product_prices)[2]
+    # The 'weibull' method matches the default 'exclusive' method of
+    # statistics.quantiles().
+    # REF: https://numpy.org/doc/stable/reference/generated/numpy.quantile.html
+    q1, q2, q3 = np.quantile(product_prices, [0.25, 0.5, 0.75],
+                             method='weibull')
     iqr = q3 - q1
 
     time.sleep(1.5)
@@ -609,17 +700,22 @@ def add_brands_csv():
         # as fieldnames and as the dictionary keys used to assign values with.
         # REF: https://docs.python.org/3.8/library/csv.html#csv.DictReader
         reader = csv.DictReader(csvfile)
+        existing_names = set(session.scalars(select(Brand.brand_name)))
+        new_brands = []
         for row in reader:
             # Check if brand already exists in the database
-            brand_in_db = session.query(Brand).filter_by(
-                brand_name=row['brand_name']).one_or_none()
-            if brand_in_db is None:
-                new_brand = Brand(
+            if row['brand_name'] not in existing_names:
+                new_brands.append(dict(
                     # Use the dictionary keys to assign values to the
                     # corresponding columns in the database.
-                    brand_name=row['brand_name'])
-                session.add(new_brand)
+                    brand_name=row['brand_name']))
+                existing_names.add(row['brand_name'])
+        # Insert all new brands in one batch instead of one INSERT per object.
+        # An empty parameter list would insert a single blank row, so skip it.
+        if new_brands:
+            session.execute(insert(Brand), new_brands)
         session.commit()
+    get_brand_name.cache_clear()
 
 
 def add_products_csv():
@@ -629,22 +725,29 @@ def add_products_csv():
         # as fieldnames and as the dictionary keys used to assign values with.
         # REF: https://docs.python.org/3.8/library/csv.html#csv.DictReader
         reader = csv.DictReader(csvfile)
+        # Load existing product names and the brand_name to brand_id mapping
+        # once up front so the loop below doesn't query the database per row.
+        existing_names = set(session.scalars(select(Product.product_name)))
+        brand_ids = dict(session.execute(
+            select(Brand.brand_name, Brand.brand_id)).all())
+        new_products = []
         for row in reader:
             # Check if product already exists in the database
-            duplicate_products_in_db = session.query(Product).filter_by(
-                product_name=row['product_name'])
-            if duplicate_products_in_db.count() == 0:
-                new_product = Product(
+            if row['product_name'] not in existing_names:
+                new_products.append(dict(
                     # Use the dictionary keys to assign values to the
                     # corresponding columns in the database.
                     product_name=row['product_name'],
                     product_quantity=int(row['product_quantity']),
                     product_price=clean_price(row['product_price']),
                     date_updated=clean_date(row['date_updated']),
-                    # Run a query to get the brand_id from the brand_name
-                    brand_id=session.query(Brand).filter_by(
-                        brand_name=row['brand_name']).one().brand_id)
-                session.add(new_product)
+                    # Look up the brand_id from the brand_name
+                    brand_id=brand_ids[row['brand_name']]))
+                existing_names.add(row['product_name'])
+        # Insert all new products in one batch instead of one INSERT per object.
+        # An empty parameter list would insert a single blank row, so skip it.
+        if new_products:
+            session.execute(insert(Product), new_products)
         session.commit()
 
 
@@ -1,21 +1,42 @@
 """Models for the application."""
-from sqlalchemy import (Column, DateTime, ForeignKey, Integer, String,
-                        create_engine)
-from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import ForeignKey, create_engine, event
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, sessionmaker
 
 engine = create_engine('sqlite:///inventory.db', echo=False)
+
+
+@event.listens_for(engine, 'connect')
+def set_sqlite_pragma(dbapi_connection, connection_record):
+    """Tune SQLite for faster writes on each new connection.
+
+    WAL journaling with synchronous=NORMAL avoids an fsync on every commit,
+    and temp tables and a 64 MiB page cache are kept in memory.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.execute('PRAGMA cache_size=-65536')
+    cursor.close()
+
+
 Session = sessionmaker(bind=engine)
 session = Session()
-Base = declarative_base()
+
+
+class Base(DeclarativeBase):
+    """Base class for the models."""
 
 
 class Brand(Base):
     """Brand class."""
 
     __tablename__ = 'brands'
-    brand_id = Column(Integer, primary_key=True, unique=True)
-    brand_name = Column('brand_name', String)
+    brand_id: Mapped[int] = mapped_column(primary_key=True, unique=True)
+    brand_name: Mapped[Optional[str]] = mapped_column('brand_name')
 
     def __repr__(self):
         """Representation of the object.
@@ -29,13 +50,16 @@ class Product(Base):
     """Product class."""
 
     __tablename__ = 'products'
-    product_id = Column(Integer, primary_key=True, unique=True)
-    product_name = Column('product_name', String)
-    product_quantity = Column('product_quantity', Integer)
-    product_price = Column('product_price', Integer)
+    product_id: Mapped[int] = mapped_column(primary_key=True, unique=True)
+    product_name: Mapped[Optional[str]] = mapped_column('product_name',
+                                                        index=True)
+    product_quantity: Mapped[Optional[int]] = mapped_column('product_quantity')
+    product_price: Mapped[Optional[int]] = mapped_column('product_price')
     # date_updated to be stored as a DateTime object instead of just Date
-    date_updated = Column('date_updated', DateTime)
-    brand_id = Column(Integer, ForeignKey('brands.brand_id'))
+    date_updated: Mapped[Optional[datetime]] = mapped_column('date_updated',
+                                                             index=True)
+    brand_id: Mapped[Optional[int]] = mapped_column(
+        ForeignKey('brands.brand_id'), index=True)
 
     def __repr__(self):
         """Representation of the object.